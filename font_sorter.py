@@ -1,9 +1,19 @@
+import argparse
 import os
 import sys
 import re
+import mmap
 import shutil
+import struct
+import time
+import unicodedata
+import zlib
 import csv
+import errno
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
 
 # You must install fonttools for this script to work:
 # pip install fonttools
@@ -14,12 +24,27 @@ except ImportError:
     print("Please install it by running: pip install fonttools")
     sys.exit(1)
 
+# Optional: pip install pyahocorasick for faster keyword stripping.
+# Without it, keywords are stripped with a regular expression instead.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Subfamily names that don't need to be added to a renamed file
+_REGULARS = frozenset({'regular', 'normal', 'roman', 'plain'})
+_SEP_RE = re.compile(r'[-_.]')
+_WS_RE = re.compile(r'\s{2,}')
+# <>:"/\|?* and control characters, mapped to None for str.translate
+_BAD_CHARS = dict.fromkeys(list(range(32)) + [ord(c) for c in '<>:"/\\|?*'])
+
 def get_font_name_property(font, name_id):
     """
     Extracts a specific name property (like Family or Subfamily) from a font's 'name' table.
     Prefers en-US (langID 0x0409) if available, then falls back to other standards.
     """
-    name_records = font['name'].names
+    # A 'name' table that failed to decompile has no records; treat it as having no names
+    name_records = getattr(font['name'], 'names', [])
     en_us_name = None
     windows_name = None
     mac_name = None
@@ -47,12 +72,130 @@ def get_font_name_property(font, name_id):
 
     return en_us_name or windows_name or mac_name or other_name
 
+# All name strings are addressed through 16-bit offsets and lengths, so a real 'name'
+# table is well under this; anything bigger is treated as corrupt
+_MAX_NAME_TABLE = 1 << 20
+
+def _find_name_table(mm):
+    """
+    Returns the raw bytes of the 'name' table from a mapped SFNT or WOFF file.
+    """
+    if mm[:4] == b'wOFF':
+        # WOFF: numTables sits at offset 12 of the 44-byte header, followed by 20-byte
+        # entries of (tag, offset, compLength, origLength, origChecksum)
+        num_tables = struct.unpack_from(">H", mm, 12)[0]
+        records = mm[44:44 + 20 * num_tables]
+        for tag, offset, comp_length, orig_length, _ in struct.iter_unpack(">4sLLLL", records):
+            if tag == b'name':
+                if orig_length > _MAX_NAME_TABLE:
+                    raise ValueError("WOFF 'name' table length is implausibly large")
+                data = mm[offset:offset + comp_length]
+                # Tables that didn't shrink are stored uncompressed
+                if comp_length < orig_length:
+                    # max_length caps the output, so corrupt data can't inflate past origLength
+                    data = zlib.decompressobj().decompress(data, orig_length)
+                return data
+    else:
+        # SFNT: numTables sits at offset 4 of the 12-byte offset table, followed by 16-byte
+        # records of (tag, checksum, offset, length)
+        num_tables = struct.unpack_from(">H", mm, 4)[0]
+        records = mm[12:12 + 16 * num_tables]
+        for tag, _, offset, length in struct.iter_unpack(">4sLLL", records):
+            if tag == b'name':
+                return mm[offset:offset + length]
+
+    raise ValueError("Font has no 'name' table")
+
+_NAME_RECORD = struct.Struct(">HHHHHH") # platformID, encodingID, languageID, nameID, length, offset
+
+def read_name_table_fast(font_path):
+    """
+    Reads the Family (nameID 1) and Subfamily (nameID 2) names straight from the
+    font's binary 'name' table, without building a fontTools object graph.
+    Handles TrueType, OpenType and WOFF files.
+    Uses the same priority as get_font_name_property.
+    Returns a (family, subfamily) tuple; either may be None if not present.
+    Raises ValueError if the file is not a readable font.
+    """
+    with open(font_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError("Not a TrueType or OpenType font (empty file)")
+        except OSError as e:
+            # Some filesystems (e.g. FUSE mounts using direct_io) can't be mapped; let fontTools read it
+            raise ValueError(f"Font file can't be memory-mapped: {e}")
+
+    with mm:
+        try:
+            data = _find_name_table(mm)
+        except (struct.error, zlib.error):
+            raise ValueError("Not a TrueType or OpenType font (not enough data)")
+
+    try:
+        _, count, storage = struct.unpack_from(">HHH", data, 0)
+
+        # One slot per priority level, per nameID (see get_font_name_property)
+        found = {1: [None, None, None, None], 2: [None, None, None, None]}
+        # nameIDs with at least one record in an encoding this reader doesn't decode
+        undecoded = set()
+        # Unpack all 12-byte records in one C-level pass rather than one call per record
+        records = _NAME_RECORD.iter_unpack(data[6:6 + 12 * count])
+        for platform_id, enc_id, lang_id, name_id, length, offset in records:
+            if name_id not in found:
+                continue
+
+            raw = data[storage + offset:storage + offset + length]
+            try:
+                if platform_id == 0 or (platform_id == 3 and enc_id in (0, 1, 10)):
+                    text = raw.decode('utf-16-be')
+                elif platform_id == 1 and enc_id == 0:
+                    text = raw.decode('mac-roman')
+                else:
+                    undecoded.add(name_id)
+                    continue
+            except UnicodeDecodeError:
+                undecoded.add(name_id)
+                continue
+
+            slots = found[name_id]
+            if platform_id == 3 and lang_id == 0x0409:
+                slots[0] = text
+            elif platform_id == 3 and enc_id == 1:
+                slots[1] = text
+            elif platform_id == 1 and enc_id == 0:
+                slots[2] = text
+            elif slots[3] is None:
+                slots[3] = text
+    except struct.error:
+        raise ValueError("Not a TrueType or OpenType font (not enough data)")
+
+    family = next((text for text in found[1] if text), None)
+    subfamily = next((text for text in found[2] if text), None)
+    if (family is None and 1 in undecoded) or (subfamily is None and 2 in undecoded):
+        # Leave legacy encodings (e.g. older CJK fonts) to fontTools rather than lose the name
+        raise ValueError("Font names use an encoding the fast reader can't decode")
+    return family, subfamily
+
+def get_font_names(font_path):
+    """
+    Returns the (family, subfamily) names of a font, using the fast 'name' table reader
+    and falling back to fontTools for anything it cannot handle.
+    """
+    try:
+        return read_name_table_fast(font_path)
+    except ValueError:
+        # Only the 'name' table is ever accessed, so lazy loading decompiles nothing else
+        with TTFont(font_path, lazy=True, recalcBBoxes=False, recalcTimestamp=False,
+                    ignoreDecompileErrors=True) as font:
+            return get_font_name_property(font, 1), get_font_name_property(font, 2)
+
 def sanitize_name(name, is_filename=False):
     """
     Removes characters that are invalid for directory or file names.
     """
     # Removes <>:"/\|?* and control characters
-    sanitized = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '', name).strip()
+    sanitized = name.translate(_BAD_CHARS).strip()
     
     # Additional check for filenames to avoid leading/trailing spaces/dots on Windows
     if is_filename:
@@ -62,6 +205,94 @@ def sanitize_name(name, is_filename=False):
     return sanitized if sanitized and sanitized != "." else None
 
 
+_COPY_BUFSIZE = 1 << 20
+
+def _copy_fd(src_fd, dst_fd):
+    """
+    Copies everything from src_fd to dst_fd, starting at their current offsets.
+    Tries in-kernel copy_file_range first (which can reflink on CoW filesystems),
+    then sendfile, then a plain read/write loop with a 1 MiB buffer.
+    Only used where os.copy_file_range exists (Linux), which also allows sendfile
+    to write to a regular file with a None offset.
+    """
+    # Each method advances both file offsets, so a later one picks up where an earlier one failed.
+    copied = 0
+    try:
+        while True:
+            n = os.copy_file_range(src_fd, dst_fd, 1 << 30)
+            if n == 0:
+                break
+            copied += n
+    except OSError:
+        pass
+    else:
+        # Some filesystems return 0 straight away without copying anything; only trust
+        # an immediate 0 if the source really is empty
+        if copied or os.fstat(src_fd).st_size == 0:
+            return
+
+    try:
+        while os.sendfile(dst_fd, src_fd, None, _COPY_BUFSIZE) > 0:
+            pass
+        return
+    except OSError:
+        pass
+
+    buf = bytearray(_COPY_BUFSIZE)
+    view = memoryview(buf)
+    with open(src_fd, 'rb', buffering=0, closefd=False) as fsrc, \
+         open(dst_fd, 'wb', closefd=False) as fdst:
+        while True:
+            n = fsrc.readinto(buf)
+            if not n:
+                break
+            fdst.write(view[:n])
+
+def _fast_copy(src, dst):
+    """
+    Copies a file's contents and metadata, like shutil.copy2.
+    Uses copy_file_range where the OS has it; elsewhere shutil.copy2 already picks
+    the platform's fast path (e.g. fcopyfile on macOS).
+    A partially written destination is removed if the copy fails.
+    """
+    if not hasattr(os, 'copy_file_range'):
+        shutil.copy2(src, dst)
+        return
+
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            try:
+                _copy_fd(src_fd, dst_fd)
+                src_size = os.fstat(src_fd).st_size
+                dst_size = os.fstat(dst_fd).st_size
+                if dst_size != src_size:
+                    raise OSError(f"Incomplete copy: wrote {dst_size} of {src_size} bytes")
+            finally:
+                os.close(dst_fd)
+            shutil.copystat(src, dst)
+        except BaseException:
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            raise
+    finally:
+        os.close(src_fd)
+
+def _move_file(src, dst):
+    """
+    Moves a file with a single os.rename, falling back to shutil.move's
+    copy-and-delete only when src and dst are on different filesystems.
+    """
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
 def load_keywords(filename="keywords.txt"):
     """
     Loads keywords from a text file located in the same directory as the script.
@@ -80,25 +311,328 @@ def load_keywords(filename="keywords.txt"):
     keywords.sort(key=len, reverse=True)
     return keywords
 
-def main():
+# Folders the script itself creates ("00 woff" is from older versions); these are never scanned for fonts
+SKIP_FOLDERS = {"00 TrueType Collection Fonts", "00 Skipped", "00 woff", "00 fon"}
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.woff', '.fon')
+
+def iter_fonts(source_folder):
+    """
+    Yields the paths of all font files under source_folder, skipping the script's own
+    output folders and macOS '._' resource-fork files. Unreadable folders are ignored.
+    """
+    # DirEntry.path is built from the folder it was scanned from, so starting from an
+    # absolute path gives absolute font paths without any os.path.join per file
+    stack = [os.path.abspath(source_folder)]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in SKIP_FOLDERS:
+                        stack.append(entry.path)
+                elif name.lower().endswith(FONT_EXTENSIONS) and not name.startswith('._'):
+                    yield entry.path
+
+@dataclass
+class FontJob:
+    """
+    Everything known about one font: inspect_font fills in where it should go,
+    then commit_font records what was actually done with it.
+    """
+    src: str
+    name: str
+    ext: str
+    family: str = ""
+    subfamily: str = ""
+    dest_folder: str = ""
+    final_name: str = ""
+    action: str = ""
+    final_path: str = ""
+    log_details: str = ""
+    error: Exception = None
+
+def inspect_font(font_path, source_folder, special_folders, strip_keywords, rename_choice):
+    """
+    Works out the destination folder and final file name for a single font.
+    Only reads the font and never writes to disk, so it is safe to run in worker threads.
+    Any exception is stored in the job's 'error' field instead of being raised.
+    """
+    original_font_name = os.path.basename(font_path)
+    stem, ext = os.path.splitext(original_font_name)
+    job = FontJob(font_path, original_font_name, ext, final_name=original_font_name)
+
+    try:
+        special = special_folders.get(ext.lower())
+        if special:
+            job.dest_folder, job.family = special
+        else:
+            family_name, subfamily_name = get_font_names(font_path)
+            family_name = family_name or stem
+            subfamily_name = subfamily_name or "Regular"
+            job.family = family_name
+            job.subfamily = subfamily_name
+
+            clean_family_for_folder = _SEP_RE.sub(' ', family_name)
+            folder_name_base = strip_keywords(clean_family_for_folder).strip()
+            folder_name_base = _WS_RE.sub(' ', folder_name_base)
+
+            folder_name = (folder_name_base or family_name).title()
+            folder_name = sanitize_name(folder_name) or stem
+            job.dest_folder = os.path.join(source_folder, folder_name)
+
+            if rename_choice == 'y':
+                subfamily_lower = subfamily_name.lower()
+                if subfamily_lower in _REGULARS or subfamily_lower in family_name.lower():
+                    new_base_name = family_name
+                else:
+                    new_base_name = f"{family_name} {subfamily_name}"
+
+                new_filename = f"{new_base_name}{ext}"
+                sanitized_filename = sanitize_name(new_filename, is_filename=True)
+                if sanitized_filename:
+                    job.final_name = sanitized_filename
+    except Exception as e:
+        job.dest_folder = ""
+        job.error = e
+
+    return job
+
+def _name_key(name):
+    """
+    Returns a case- and Unicode-form-insensitive key for a file name, so names that
+    might refer to the same file on some filesystems are grouped together.
+    """
+    return unicodedata.normalize('NFC', name).casefold()
+
+def _release_name(claimed, path):
+    """
+    Frees the name of a file that was moved away, if its folder has already been listed.
+    """
+    names = claimed.get(os.path.dirname(path))
+    if names is not None:
+        name = os.path.basename(path)
+        key = _name_key(name)
+        exact = names.get(key)
+        if exact is not None:
+            exact.discard(name)
+            if not exact:
+                del names[key]
+
+def _claimed_names(claimed, folder):
+    """
+    Returns the names taken in folder as {_name_key: set of exact names}, listing it on first use.
+    """
+    names = claimed.get(folder)
+    if names is None:
+        names = {}
+        try:
+            for name in os.listdir(folder):
+                names.setdefault(_name_key(name), set()).add(name)
+        except FileNotFoundError:
+            pass
+        claimed[folder] = names
+    return names
+
+def _is_taken(names, folder, name):
+    """
+    Checks whether name is already used in folder, given that folder's claimed names.
+    """
+    exact = names.get(_name_key(name))
+    if not exact:
+        return False
+    if name in exact:
+        return True
+    # Only case or Unicode form differs; whether that clashes depends on the filesystem
+    return os.path.exists(os.path.join(folder, name))
+
+def _claim(names, name):
+    """
+    Records name as taken in a folder's claimed names.
+    """
+    names.setdefault(_name_key(name), set()).add(name)
+
+def commit_font(job, choice, rename_choice, skipped_folder, claimed):
+    """
+    Copies or moves an inspected font into place. If the target already exists, the font
+    is moved into the skipped folder instead. Must run on the main thread, one font at a time.
+    'claimed' maps each folder to the names taken in it, so a stat is only needed when
+    a name differs from a taken one just by case or Unicode form.
+    Records the outcome in the job's action, dest_folder, final_path and log_details.
+    """
+    ideal_target_path = os.path.join(job.dest_folder, job.final_name)
+    dest_names = _claimed_names(claimed, job.dest_folder)
+
+    if _is_taken(dest_names, job.dest_folder, job.final_name):
+        # --- ACTION: SKIP (MOVE AND RENAME IN SKIPPED FOLDER) ---
+        # Created the first time a duplicate turns up, i.e. before the folder is first listed
+        if skipped_folder not in claimed:
+            os.makedirs(skipped_folder, exist_ok=True)
+        skipped_names = _claimed_names(claimed, skipped_folder)
+
+        # Determine final name in skipped folder using the ORIGINAL file name
+        skipped_name = job.name
+        counter = 1
+        base, ext = os.path.splitext(skipped_name)
+        while _is_taken(skipped_names, skipped_folder, skipped_name):
+            skipped_name = f"{base}_{counter}{ext}"
+            counter += 1
+
+        final_path = os.path.join(skipped_folder, skipped_name)
+        _move_file(job.src, final_path) # Always move duplicates
+        _claim(skipped_names, skipped_name)
+        _release_name(claimed, job.src)
+
+        job.action = "Skipped (Duplicate)"
+        job.dest_folder = skipped_folder # Update for logging
+        job.final_path = final_path
+        job.log_details = f"File already exists at: {ideal_target_path}"
+        return
+
+    # --- ACTION: COPY or MOVE ---
+    # dest_folder was already created by main() after the inspect stage
+    if choice == 'c': _fast_copy(job.src, ideal_target_path)
+    elif choice == 'm': _move_file(job.src, ideal_target_path)
+    _claim(dest_names, job.final_name)
+    if choice == 'm':
+        _release_name(claimed, job.src)
+
+    job.action = "Copied" if choice == 'c' else "Moved"
+    if rename_choice == 'y' and job.name != job.final_name:
+        job.action += " & Renamed"
+    job.final_path = ideal_target_path
+
+def _is_word_char(char):
+    """
+    Matches the definition of a word character used by the regex engine's \\w.
+    """
+    return char.isalnum() or char == '_'
+
+def _trie_to_regex(node):
+    """
+    Turns a character trie (nested dicts, '' marking the end of a word) into a regex
+    that shares common prefixes, e.g. ['bold', 'book'] -> 'bo(?:ld|ok)'.
+    """
+    branches = [re.escape(char) + _trie_to_regex(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    if len(branches) == 1 and '' not in node:
+        return branches[0]
+    group = '(?:' + '|'.join(branches) + ')'
+    # A word may end here; the greedy '?' still tries the longer keywords first
+    return group + '?' if '' in node else group
+
+def build_keyword_stripper(keywords):
+    """
+    Returns a function that removes whole-word keywords from a string, ignoring case.
+    Uses an Aho-Corasick automaton when pyahocorasick is installed, otherwise a regex.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword.lower():
+            node = node.setdefault(char, {})
+        node[''] = True
+    keyword_pattern = re.compile(r'\b(?:' + _trie_to_regex(trie) + r')\b', re.IGNORECASE)
+
+    def strip_with_regex(text):
+        return keyword_pattern.sub('', text)
+
+    if ahocorasick is None or not keywords:
+        return strip_with_regex
+
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        lowered = keyword.lower()
+        automaton.add_word(lowered, len(lowered))
+    automaton.make_automaton()
+
+    def is_boundary(text, index):
+        before = index > 0 and _is_word_char(text[index - 1])
+        after = index < len(text) and _is_word_char(text[index])
+        return before != after
+
+    def strip_with_automaton(text):
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Lowercasing changed the length, so match offsets wouldn't line up with the text
+            return strip_with_regex(text)
+
+        spans = []
+        for end, length in automaton.iter(lowered):
+            start = end + 1 - length
+            if is_boundary(lowered, start) and is_boundary(lowered, end + 1):
+                spans.append((start, end + 1))
+
+        # Same result as the regex: leftmost match first, longest match at the same start
+        spans.sort(key=lambda span: (span[0], -span[1]))
+        pieces = []
+        pos = 0
+        for start, stop in spans:
+            if start >= pos:
+                pieces.append(text[pos:start])
+                pos = stop
+        pieces.append(text[pos:])
+        return ''.join(pieces)
+
+    return strip_with_automaton
+
+def show_progress(message):
+    """
+    Overwrites the current console line with message, cut to the terminal width.
+    """
+    width = shutil.get_terminal_size().columns - 1
+    sys.stdout.write('\r' + message[:width].ljust(width))
+    sys.stdout.flush()
+
+def clear_progress():
+    """
+    Blanks the progress line so a regular print starts on a clean line.
+    """
+    width = shutil.get_terminal_size().columns - 1
+    sys.stdout.write('\r' + ' ' * width + '\r')
+
+def parse_args():
+    """
+    Parses the command-line options. Any option left out is asked for interactively.
+    """
+    parser = argparse.ArgumentParser(description="Sort fonts into folders by family name.")
+    parser.add_argument('--src', help="full path to the fonts folder")
+    parser.add_argument('--action', choices=['c', 'm'], help="(c)opy or (m)ove the fonts")
+    parser.add_argument('--rename', choices=['y', 'n'], help="rename fonts based on their metadata")
+    parser.add_argument('--log', choices=['y', 'n'], help="create a CSV log")
+    parser.add_argument('--jobs', type=int, help="number of threads reading font metadata (default: twice the CPU count)")
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+def main(args):
     """
     Main function to run the font sorting script.
     """
     style_keywords = load_keywords()
-    keyword_pattern = r'\b(' + '|'.join(re.escape(k) for k in style_keywords) + r')\b'
+    strip_keywords = build_keyword_stripper(style_keywords)
     
-    source_folder = input("Enter the full path to your fonts folder: ")
+    source_folder = args.src or input("Enter the full path to your fonts folder: ")
 
     if not os.path.isdir(source_folder):
         print("Error: Path does not exist. Exiting.")
         sys.exit(1)
+    # Keep destination paths on the same absolute footing as the scanned font paths
+    source_folder = os.path.abspath(source_folder)
 
-    choice = input("Do you want to (c)opy or (m)ove the fonts? ").lower()
+    choice = args.action or input("Do you want to (c)opy or (m)ove the fonts? ").lower()
     if choice not in ['c', 'm']:
         print("Invalid choice. Exiting.")
         sys.exit(1)
 
-    rename_choice = input("Do you want to rename fonts based on their metadata? (y/n) ").lower()
+    rename_choice = args.rename or input("Do you want to rename fonts based on their metadata? (y/n) ").lower()
     if rename_choice not in ['y', 'n']:
         print("Invalid choice. Exiting.")
         sys.exit(1)
@@ -106,11 +640,11 @@ def main():
     log_file_path = None
     csv_writer = None
     log_file = None
-    log_choice = input("Do you want to create a CSV log? (y/n) ").lower()
+    log_choice = args.log or input("Do you want to create a CSV log? (y/n) ").lower()
     if log_choice == 'y':
         log_file_path = os.path.join(source_folder, "FontSortLog.csv")
         try:
-            log_file = open(log_file_path, 'w', newline='', encoding='utf-8')
+            log_file = open(log_file_path, 'w', newline='', encoding='utf-8', buffering=1 << 20)
             csv_writer = csv.writer(log_file)
             csv_writer.writerow([
                 "Timestamp", "Action", "OriginalFile", "NewFile", "Family", "Subfamily",
@@ -120,14 +654,7 @@ def main():
             print(f"Error: Could not create log file. {e}")
             log_choice = 'n'
     
-    font_files = []
-    for root, _, files in os.walk(source_folder):
-        # Prevent walking into the folders the script itself creates
-        if os.path.basename(root) in ["00 TrueType Collection Fonts", "00 Skipped", "00 woff", "00 fon"]:
-            continue
-        for file in files:
-            if file.lower().endswith(('.ttf', '.otf', '.ttc', '.woff', '.fon')) and not file.startswith('._'):
-                font_files.append(os.path.join(root, file))
+    font_files = list(iter_fonts(source_folder))
 
     total = len(font_files)
     if total == 0:
@@ -138,120 +665,87 @@ def main():
     failure_count = 0
     skipped_count = 0
     
-    ttc_folder = os.path.join(source_folder, "00 TrueType Collection Fonts")
-    woff_folder = os.path.join(source_folder, "00 woff")
-    fon_folder = os.path.join(source_folder, "00 fon")
     skipped_folder = os.path.join(source_folder, "00 Skipped")
+    special_folders = {
+        '.ttc': (os.path.join(source_folder, "00 TrueType Collection Fonts"), "TTC Collection"),
+        '.fon': (os.path.join(source_folder, "00 fon"), "FON Font"),
+    }
+    claimed = {}
+    log_batch = []
+    # A self-overwriting status line only makes sense on a terminal; otherwise print every line
+    use_status_line = sys.stdout.isatty()
+    progress_shown = False
+    last_progress = 0.0
 
-    for i, font_path in enumerate(font_files, 1):
-        original_font_name = os.path.basename(font_path)
-        
-        # Default values for loop variables
-        action_verb = ""
-        display_action = ""
-        final_font_name = original_font_name
-        dest_folder = ""
-        final_path = ""
-        log_family = ""
-        log_subfamily = ""
-        log_details = ""
+    # Stage 1 (parallel): read metadata and work out destinations.
+    # Stage 2 (serial, grouped by destination): check duplicates, copy/move and log.
+    inspect = partial(inspect_font, source_folder=source_folder, special_folders=special_folders,
+                      strip_keywords=strip_keywords, rename_choice=rename_choice)
+    with ThreadPoolExecutor(max_workers=args.jobs or (os.cpu_count() or 1) * 2) as executor:
+        jobs = list(executor.map(inspect, font_files))
+    jobs.sort(key=lambda job: job.dest_folder)
 
+    # Create each destination folder once up front instead of checking for it per font
+    for folder in {job.dest_folder for job in jobs if job.error is None}:
         try:
-            if choice == 'c': action_verb = "Copied"
-            elif choice == 'm': action_verb = "Moved"
-            
-            # --- FOLDER AND FILENAME DETERMINATION ---
-            if font_path.lower().endswith(".ttc"):
-                dest_folder = ttc_folder
-                log_family = "TTC Collection"
-            elif font_path.lower().endswith(".woff"):
-                dest_folder = woff_folder
-                log_family = "WOFF Font"
-            elif font_path.lower().endswith(".fon"):
-                dest_folder = fon_folder
-                log_family = "FON Font"
-            else:
-                with TTFont(font_path, lazy=True) as font:
-                    family_name = get_font_name_property(font, 1) or os.path.splitext(original_font_name)[0]
-                    subfamily_name = get_font_name_property(font, 2) or "Regular"
-                    log_family = family_name
-                    log_subfamily = subfamily_name
-
-                    clean_family_for_folder = re.sub(r'[-_.]', ' ', family_name)
-                    folder_name_base = re.sub(keyword_pattern, '', clean_family_for_folder, flags=re.IGNORECASE).strip()
-                    folder_name_base = re.sub(r'\s{2,}', ' ', folder_name_base)
-                    
-                    folder_name = (folder_name_base or family_name).title()
-                    folder_name = sanitize_name(folder_name) or os.path.splitext(original_font_name)[0]
-                    dest_folder = os.path.join(source_folder, folder_name)
-
-                    if rename_choice == 'y':
-                        if subfamily_name.lower() in ['regular', 'normal', 'roman', 'plain'] or subfamily_name.lower() in family_name.lower():
-                            new_base_name = family_name
-                        else:
-                            new_base_name = f"{family_name} {subfamily_name}"
-                        
-                        _, ext = os.path.splitext(original_font_name)
-                        new_filename = f"{new_base_name}{ext}"
-                        sanitized_filename = sanitize_name(new_filename, is_filename=True)
-                        if sanitized_filename:
-                            final_font_name = sanitized_filename
-            
-            # --- DUPLICATE HANDLING LOGIC ---
-            ideal_target_path = os.path.join(dest_folder, final_font_name)
-
-            if os.path.exists(ideal_target_path):
-                # --- ACTION: SKIP (MOVE AND RENAME IN SKIPPED FOLDER) ---
-                if not os.path.exists(skipped_folder):
-                    os.makedirs(skipped_folder)
-                
-                # REVERTED: Determine final path in skipped folder using the ORIGINAL file name
-                final_path = os.path.join(skipped_folder, original_font_name)
-                counter = 1
-                base, ext = os.path.splitext(final_path)
-                while os.path.exists(final_path):
-                    final_path = f"{base}_{counter}{ext}"
-                    counter += 1
-                
-                shutil.move(font_path, final_path) # Always move duplicates
-                skipped_count += 1
-                display_action = "Skipped (Duplicate)"
-                log_details = f"File already exists at: {ideal_target_path}"
-                dest_folder = skipped_folder # Update for logging
-                # REVERTED: Simplified print statement for skipped files
-                print(f"[{i}/{total}] {display_action}: '{original_font_name}' moved to '{os.path.basename(skipped_folder)}' as target already exists.")
-
-            else:
-                # --- ACTION: COPY or MOVE ---
-                if not os.path.exists(dest_folder):
-                    os.makedirs(dest_folder)
-                
-                final_path = ideal_target_path
-                if choice == 'c': shutil.copy2(font_path, final_path)
-                elif choice == 'm': shutil.move(font_path, final_path)
-
-                success_count += 1
-                display_action = action_verb
-                if rename_choice == 'y' and original_font_name != os.path.basename(final_path):
-                    display_action += " & Renamed"
-                print(f"[{i}/{total}] {display_action}: {original_font_name} → {os.path.basename(final_path)} in '{os.path.basename(dest_folder)}'")
-
-        except Exception as e:
-            failure_count += 1
-            display_action = "Error"
-            final_path = "" # No final path on error
-            log_details = str(e)
-            print(f"[{i}/{total}] Error processing {original_font_name}: {e}")
-
-        # --- LOG TO CSV ---
-        if log_choice == 'y':
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            new_file_name_for_log = os.path.basename(final_path) if final_path else ""
-            csv_writer.writerow([
-                timestamp, display_action, original_font_name, new_file_name_for_log,
-                log_family, log_subfamily, dest_folder, final_path, log_details
-            ])
-            
+            os.makedirs(folder, exist_ok=True)
+        except OSError as e:
+            print(f"Error: Could not create folder '{folder}'. {e}")
+
+    # Whatever happens (including Ctrl-C), log every operation already done and close the log
+    try:
+        for i, job in enumerate(jobs, 1):
+            try:
+                if job.error is not None:
+                    raise job.error
+
+                commit_font(job, choice, rename_choice, skipped_folder, claimed)
+
+                if job.action == "Skipped (Duplicate)":
+                    skipped_count += 1
+                    if progress_shown:
+                        clear_progress()
+                        progress_shown = False
+                    print(f"[{i}/{total}] {job.action}: '{job.name}' moved to '{os.path.basename(skipped_folder)}' as target already exists.")
+                elif use_status_line:
+                    success_count += 1
+                    # Successes only update a single status line, at most every 50ms
+                    now = time.monotonic()
+                    if now - last_progress > 0.05 or i == total:
+                        show_progress(f"[{i}/{total}] {job.action}: {job.name[:60]}")
+                        progress_shown = True
+                        last_progress = now
+                else:
+                    success_count += 1
+                    print(f"[{i}/{total}] {job.action}: {job.name} → {os.path.basename(job.final_path)} in '{os.path.basename(job.dest_folder)}'")
+
+            except Exception as e:
+                failure_count += 1
+                job.action = "Error"
+                job.final_path = "" # No final path on error
+                job.log_details = str(e)
+                if progress_shown:
+                    clear_progress()
+                    progress_shown = False
+                print(f"[{i}/{total}] Error processing {job.name}: {e}")
+
+            # --- LOG TO CSV ---
+            if log_choice == 'y':
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                new_file_name_for_log = os.path.basename(job.final_path) if job.final_path else ""
+                log_batch.append([
+                    timestamp, job.action, job.name, new_file_name_for_log,
+                    job.family, job.subfamily, job.dest_folder, job.final_path, job.log_details
+                ])
+                if len(log_batch) >= 256:
+                    csv_writer.writerows(log_batch)
+                    log_batch.clear()
+    finally:
+        if log_batch:
+            csv_writer.writerows(log_batch)
+        if log_file:
+            log_file.close()
+
     print("\n--------------------")
     print("Processing Complete.")
     print(f"Total files scanned:    {total}")
@@ -260,9 +754,8 @@ def main():
     print(f"  Failed:               {failure_count}")
 
     if log_file:
-        log_file.close()
         print(f"\nLog file saved at: {log_file_path}")
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
 